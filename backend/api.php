@@ -18,6 +18,9 @@ function debug_log($message, $data = null) {
     error_log($log);
 }
 
+// Full payload and per-URL dumps are only logged when DEBUG is set
+define('VERBOSE_DEBUG', (bool) getenv('DEBUG'));
+
 debug_log("PHP script started");
 
 // Set up headers for web requests
@@ -34,6 +37,37 @@ if (php_sapi_name() !== 'cli') {
     }
 }
 
+// Browser identity sent with every check
+const BROWSER_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36';
+
+// Browser-like request headers sent with every check
+// Accept-Encoding comes from CURLOPT_ENCODING so it only lists encodings cURL
+// can decode, and connection management is left to cURL (HTTP/2 forbids
+// Connection headers)
+const BROWSER_HEADERS = [
+    'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language: en-US,en;q=0.9',
+    'Cache-Control: no-cache',
+    'Pragma: no-cache',
+    'Sec-Ch-Ua: "Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
+    'Sec-Ch-Ua-Mobile: ?0',
+    'Sec-Ch-Ua-Platform: "macOS"',
+    'Sec-Fetch-Dest: document',
+    'Sec-Fetch-Mode: navigate',
+    'Sec-Fetch-Site: none',
+    'Sec-Fetch-User: ?1',
+    'Upgrade-Insecure-Requests: 1'
+];
+
+// Largest response body read (and discarded) before a check is cut short
+const MAX_BODY_SIZE = 256 * 1024;
+
+// One in this many runs sweeps expired entries from the result cache
+const CACHE_SWEEP_ODDS = 50;
+
+// Maximum number of attempts per URL for transient failures
+const MAX_ATTEMPTS = 3;
+
 // Set up temp directory
 $tempDir = getenv('TEMP_DIR') ?: (is_dir('/tmp') ? '/tmp' : sys_get_temp_dir());
 $tempDir = rtrim($tempDir, '/') . '/temp';
@@ -52,6 +86,27 @@ foreach (['uploads', 'results'] as $dir) {
     }
 }
 
+// Number of URLs checked in parallel
+$maxConcurrency = max(1, (int) (getenv('MAX_CONCURRENCY') ?: 8));
+
+// Seconds a previous check of the same URL is reused for (0 disables the cache)
+$cacheTtl = max(0, (int) getenv('URL_CACHE_TTL'));
+$cacheDir = $tempDir . '/cache';
+
+// Create the cache directory only when the cache is enabled. Sibling workers
+// may race to create it, so a failed mkdir is fine as long as it now exists;
+// warnings would end up in the JSON on stdout.
+if ($cacheTtl > 0 && !is_dir($cacheDir) && !@mkdir($cacheDir, 0777, true) && !is_dir($cacheDir)) {
+    debug_log("Cache directory unavailable, caching disabled: " . $cacheDir);
+    $cacheTtl = 0;
+}
+
+// Occasionally sweep expired entries so the cache directory doesn't grow
+// without bound with URLs that are never checked again
+if ($cacheTtl > 0 && mt_rand(1, CACHE_SWEEP_ODDS) === 1) {
+    sweepCache($cacheDir, $cacheTtl);
+}
+
 // Check if running from command line
 $isCli = php_sapi_name() === 'cli';
 debug_log("Running in CLI mode: " . ($isCli ? "yes" : "no"));
@@ -66,22 +121,22 @@ try {
         $input = file_get_contents('php://input');
     }
     
-    debug_log("Raw input:", $input);
+    if (VERBOSE_DEBUG) {
+        debug_log("Raw input:", $input);
+    }
     
     // Parse JSON input
     $data = json_decode($input, true);
-    debug_log("Parsed input:", $data);
+    if (VERBOSE_DEBUG) {
+        debug_log("Parsed input:", $data);
+    }
     
     if (!$data || !isset($data['urls']) || !is_array($data['urls'])) {
         throw new Exception("Invalid or missing JSON data");
     }
     
     // Process URLs
-    $results = [];
-    foreach ($data['urls'] as $url) {
-        $result = checkUrl($url);
-        $results[] = $result;
-    }
+    $results = checkUrls($data['urls'], $maxConcurrency, $cacheDir, $cacheTtl);
     
     // Prepare output
     $output = [
@@ -108,144 +163,297 @@ try {
     exit(1);
 }
 
-// Function to validate URL
-function isValidUrl($url) {
+// Function to normalize URL
+function normalizeUrl($url) {
     // Clean the URL first
     $url = trim($url);
     
     // Add http:// if no protocol is specified
-    if (!preg_match("~^(?:f|ht)tps?://~i", $url) && !preg_match("~^http://~i", $url)) {
+    if (!preg_match("~^(?:f|ht)tps?://~i", $url)) {
         $url = "http://" . $url;
     }
     
-    // Validate the URL
-    return filter_var($url, FILTER_VALIDATE_URL) !== false;
+    return $url;
 }
 
-// Function to check URL redirects
-function checkUrl($url) {
-    // Clean and validate URL
-    $url = trim($url);
-    if (!preg_match("~^(?:f|ht)tps?://~i", $url)) {
-        $url = "http://" . $url;
+// Function to validate URL
+function isValidUrl($url) {
+    return filter_var(normalizeUrl($url), FILTER_VALIDATE_URL) !== false;
+}
+
+// Function to check a batch of URLs concurrently
+// At most $maxConcurrency transfers run at once; finished handles go back to
+// an idle pool and are reused so keep-alive connections survive between URLs
+function checkUrls($urls, $maxConcurrency = 8, $cacheDir = null, $cacheTtl = 0) {
+    $mh = curl_multi_init();
+    // Multiplex concurrent checks against the same host over shared HTTP/2
+    // connections and keep a larger cache of idle connections for reuse
+    curl_multi_setopt($mh, CURLMOPT_PIPELINING, CURLPIPE_MULTIPLEX);
+    curl_multi_setopt($mh, CURLMOPT_MAXCONNECTS, 32);
+    $pool = [];
+    $active = [];
+    $results = [];
+    $headers = [];
+    // Normalize the whole batch once up front and check each distinct URL once
+    $urls = array_map('normalizeUrl', array_values($urls));
+    $unique = array_values(array_unique($urls));
+
+    // Reuse results cached by earlier runs so repeated batches only check new URLs
+    $queue = [];
+    foreach ($unique as $index => $url) {
+        $cached = $cacheTtl > 0 ? readCachedResult($cacheDir, $url, $cacheTtl) : null;
+        if ($cached !== null) {
+            $results[$index] = $cached;
+        } else {
+            $queue[] = $index;
+        }
     }
 
-    // First request to get initial status
-    $ch = curl_init();
-    curl_setopt_array($ch, [
-        CURLOPT_URL => $url,
-        CURLOPT_RETURNTRANSFER => true,
-        CURLOPT_FOLLOWLOCATION => false,
-        CURLOPT_TIMEOUT => 30,
-        CURLOPT_SSL_VERIFYPEER => false,
-        CURLOPT_SSL_VERIFYHOST => false,
-        CURLOPT_HEADER => true,
-        CURLOPT_NOBODY => false,
-        CURLOPT_HTTP_VERSION => CURL_HTTP_VERSION_1_1,
-        CURLOPT_HTTPHEADER => [
-            'User-Agent: Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-            'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language: en-US,en;q=0.9',
-            'Accept-Encoding: gzip, deflate, br',
-            'Connection: keep-alive',
-            'Cache-Control: no-cache',
-            'Pragma: no-cache',
-            'Sec-Ch-Ua: "Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
-            'Sec-Ch-Ua-Mobile: ?0',
-            'Sec-Ch-Ua-Platform: "macOS"',
-            'Sec-Fetch-Dest: document',
-            'Sec-Fetch-Mode: navigate',
-            'Sec-Fetch-Site: none',
-            'Sec-Fetch-User: ?1',
-            'Upgrade-Insecure-Requests: 1'
-        ],
-        CURLOPT_ENCODING => '',  // Accept all encodings
-        CURLOPT_REFERER => 'https://www.google.com/'  // Add a common referrer
-    ]);
+    $total = count($queue);
+    $next = 0;
+    $retries = [];
+
+    while ($next < $total || !empty($active) || !empty($retries)) {
+        // Start new transfers while there are free slots, due retries first
+        $now = microtime(true);
+        while (count($active) < $maxConcurrency) {
+            $index = null;
+            $attempt = 0;
+            foreach ($retries as $retryIndex => $retry) {
+                if ($retry['at'] <= $now) {
+                    $index = $retryIndex;
+                    $attempt = $retry['attempt'];
+                    unset($retries[$retryIndex]);
+                    break;
+                }
+            }
+            if ($index === null) {
+                if ($next >= $total) break;
+                $index = $queue[$next++];
+            }
+
+            $url = $unique[$index];
+            $ch = array_pop($pool) ?: createCurlHandle();
+            $headers[$index] = '';
+            configureCurlHandle($ch, $url, $headers[$index]);
+            curl_multi_add_handle($mh, $ch);
+            $active[] = ['handle' => $ch, 'index' => $index, 'url' => $url, 'attempt' => $attempt];
+        }
+
+        do {
+            $status = curl_multi_exec($mh, $running);
+        } while ($status === CURLM_CALL_MULTI_PERFORM);
 
-    $response = curl_exec($ch);
-    $initialStatus = curl_getinfo($ch, CURLINFO_HTTP_CODE);
-    curl_close($ch);
+        // Collect finished transfers and return their handles to the pool
+        while ($info = curl_multi_info_read($mh)) {
+            foreach ($active as $key => $job) {
+                if ($job['handle'] !== $info['handle']) continue;
 
-    // Now follow redirects with the same browser-like settings
+                $ch = $job['handle'];
+                $index = $job['index'];
+                $attempt = $job['attempt'] + 1;
+                $status = curl_getinfo($ch, CURLINFO_RESPONSE_CODE);
+                $retriable = isRetriable($info['result'], $status);
+                if ($attempt < MAX_ATTEMPTS && $retriable) {
+                    // Exponential backoff with jitter before trying again
+                    $delay = (2 ** $job['attempt']) + mt_rand() / mt_getrandmax();
+                    $retries[$index] = ['attempt' => $attempt, 'at' => microtime(true) + $delay];
+                    debug_log("Retrying " . $job['url'] . " in " . round($delay, 2) . "s");
+                } else {
+                    // An oversized body being cut off still leaves complete headers
+                    $ok = $info['result'] === CURLE_OK || $info['result'] === CURLE_FILESIZE_EXCEEDED;
+                    $error = $ok ? '' : (curl_error($ch) ?: curl_strerror($info['result']));
+                    $results[$index] = checkUrl($ch, $job['url'], $headers[$index], $error);
+                    // Only cache settled outcomes; transient failures and server
+                    // errors must be re-checked on the next run
+                    if ($cacheTtl > 0 && $error === '' && !$retriable && $status < 500) {
+                        writeCachedResult($cacheDir, $job['url'], $results[$index]);
+                    }
+                }
+                unset($headers[$index]);
+
+                curl_multi_remove_handle($mh, $ch);
+                $pool[] = $ch;
+                unset($active[$key]);
+                break;
+            }
+        }
+
+        if (!empty($active)) {
+            if (curl_multi_select($mh, 1.0) === -1) {
+                usleep(1000);
+            }
+        } elseif (!empty($retries)) {
+            // Nothing in flight; sleep until the earliest retry is due
+            $wait = min(array_column($retries, 'at')) - microtime(true);
+            if ($wait > 0) {
+                usleep((int) ($wait * 1000000));
+            }
+        }
+    }
+
+    foreach ($pool as $ch) {
+        curl_close($ch);
+    }
+    curl_multi_close($mh);
+
+    // Fan results back out to every occurrence in the original order
+    $checked = [];
+    foreach ($results as $index => $result) {
+        $checked[$unique[$index]] = $result;
+    }
+    return array_map(function ($url) use ($checked) {
+        return $checked[$url];
+    }, $urls);
+}
+
+// Function to get the cache file path for a URL
+function getCacheFile($cacheDir, $url) {
+    return $cacheDir . '/' . sha1($url) . '.json';
+}
+
+// Function to read a cached check result that is younger than $ttl seconds
+function readCachedResult($cacheDir, $url, $ttl) {
+    // A sibling worker may remove the file at any point, so every filesystem
+    // call tolerates it disappearing
+    $file = getCacheFile($cacheDir, $url);
+    $modified = @filemtime($file);
+    if ($modified === false) {
+        return null;
+    }
+    if ($modified < time() - $ttl) {
+        @unlink($file);
+        return null;
+    }
+    $contents = @file_get_contents($file);
+    if ($contents === false) {
+        return null;
+    }
+    $result = json_decode($contents, true);
+    return is_array($result) ? $result : null;
+}
+
+// Function to remove cache entries older than $ttl seconds
+function sweepCache($cacheDir, $ttl) {
+    $expired = time() - $ttl;
+    foreach (glob($cacheDir . '/*.json') ?: [] as $file) {
+        $modified = @filemtime($file);
+        if ($modified !== false && $modified < $expired) {
+            @unlink($file);
+        }
+    }
+}
+
+// Function to store a successful check result in the cache
+function writeCachedResult($cacheDir, $url, $result) {
+    @file_put_contents(getCacheFile($cacheDir, $url), json_encode($result), LOCK_EX);
+}
+
+// Function to decide whether a failed check is worth retrying
+// Timeouts, dropped connections, rate limiting and temporary unavailability
+// are transient; refused connections, DNS, TLS and other errors fail
+// immediately
+function isRetriable($curlResult, $status) {
+    if (in_array($curlResult, [
+        CURLE_OPERATION_TIMEDOUT,
+        CURLE_GOT_NOTHING,
+        CURLE_SEND_ERROR,
+        CURLE_RECV_ERROR
+    ], true)) {
+        return true;
+    }
+    return in_array($status, [429, 503], true);
+}
+
+// Function to create a cURL handle with the options shared by every check
+// Redirects are followed with browser-like settings; the initial status is
+// the first status line in the chain, so no separate request is needed.
+// Only status codes and locations are needed, so the final response body
+// is read and discarded rather than buffered. Small bodies are read to the
+// end so HTTP/1.1 connections stay reusable for the next URL. Larger ones are
+// cut off by CURLOPT_MAXFILESIZE (announced sizes always; chunked bodies with
+// libcurl 8.4+), which costs that connection but saves the download. A GET
+// is still sent because many servers answer HEAD requests differently.
+function createCurlHandle() {
     $ch = curl_init();
     curl_setopt_array($ch, [
-        CURLOPT_URL => $url,
-        CURLOPT_RETURNTRANSFER => true,
+        CURLOPT_WRITEFUNCTION => function ($ch, $data) {
+            return strlen($data);
+        },
+        CURLOPT_MAXFILESIZE => MAX_BODY_SIZE,
         CURLOPT_FOLLOWLOCATION => true,
         CURLOPT_MAXREDIRS => 10,
         CURLOPT_TIMEOUT => 30,
+        CURLOPT_CONNECTTIMEOUT => 10,  // Fail fast on unreachable hosts
         CURLOPT_SSL_VERIFYPEER => false,
         CURLOPT_SSL_VERIFYHOST => false,
-        CURLOPT_HEADER => true,
+        CURLOPT_HEADER => false,
         CURLOPT_NOBODY => false,
-        CURLOPT_HTTP_VERSION => CURL_HTTP_VERSION_1_1,
-        CURLOPT_HTTPHEADER => [
-            'User-Agent: Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-            'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language: en-US,en;q=0.9',
-            'Accept-Encoding: gzip, deflate, br',
-            'Connection: keep-alive',
-            'Cache-Control: no-cache',
-            'Pragma: no-cache',
-            'Sec-Ch-Ua: "Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
-            'Sec-Ch-Ua-Mobile: ?0',
-            'Sec-Ch-Ua-Platform: "macOS"',
-            'Sec-Fetch-Dest: document',
-            'Sec-Fetch-Mode: navigate',
-            'Sec-Fetch-Site: none',
-            'Sec-Fetch-User: ?1',
-            'Upgrade-Insecure-Requests: 1'
-        ],
+        CURLOPT_HTTP_VERSION => CURL_HTTP_VERSION_2TLS,  // HTTP/2 over TLS, HTTP/1.1 otherwise
+        CURLOPT_PIPEWAIT => true,  // Prefer multiplexing on an existing connection
+        CURLOPT_USERAGENT => BROWSER_USER_AGENT,
+        CURLOPT_HTTPHEADER => BROWSER_HEADERS,
         CURLOPT_ENCODING => '',  // Accept all encodings
         CURLOPT_REFERER => 'https://www.google.com/'  // Add a common referrer
     ]);
+    return $ch;
+}
 
-    $response = curl_exec($ch);
-    $headerSize = curl_getinfo($ch, CURLINFO_HEADER_SIZE);
-    $headers = substr($response, 0, $headerSize);
+// Function to point a pooled cURL handle at the next URL
+// Only the per-URL options change; response headers are collected into $headers
+function configureCurlHandle($ch, $url, &$headers) {
+    curl_setopt_array($ch, [
+        CURLOPT_URL => $url,
+        CURLOPT_HEADERFUNCTION => function ($ch, $line) use (&$headers) {
+            $headers .= $line;
+            return strlen($line);
+        }
+    ]);
+}
+
+// Function to check URL redirects from a completed transfer
+function checkUrl($ch, $url, $headers, $error) {
     $finalUrl = curl_getinfo($ch, CURLINFO_EFFECTIVE_URL);
     $redirectCount = curl_getinfo($ch, CURLINFO_REDIRECT_COUNT);
-    $error = curl_error($ch);
 
     $redirectChain = [];
     
-    // Parse headers to get redirect chain
-    $headerGroups = explode("\r\n\r\n", $headers);
+    // Parse headers to get redirect chain; every response in the chain
+    // starts with its own status line
     $currentStatus = null;
     $currentUrl = $url;
     $allStatuses = [];
     $finalStatus = null;
 
-    foreach ($headerGroups as $headerGroup) {
-        if (empty(trim($headerGroup))) continue;
-        
-        $headerLines = explode("\r\n", $headerGroup);
-        foreach ($headerLines as $line) {
-            if (preg_match('/^HTTP\/\d\.\d\s+(\d{3})/', $line, $matches)) {
-                $currentStatus = intval($matches[1]);
-                $allStatuses[] = $currentStatus;
-            } elseif (preg_match('/^Location:\s*(.+)$/i', $line, $matches) && $currentStatus) {
-                $location = trim($matches[1]);
-                // Handle relative URLs
-                if (strpos($location, 'http') !== 0) {
-                    if (strpos($location, '/') === 0) {
-                        $parsedUrl = parse_url($currentUrl);
-                        $location = $parsedUrl['scheme'] . '://' . $parsedUrl['host'] . $location;
-                    } else {
-                        $location = rtrim($currentUrl, '/') . '/' . ltrim($location, '/');
-                    }
+    // One scan over the whole header block finds every status line and
+    // Location header in order
+    preg_match_all('/^(?:HTTP\/\d(?:\.\d)?[ \t]+(\d{3})|Location:[ \t]*(\S[^\r\n]*))/im', $headers, $headerMatches, PREG_SET_ORDER);
+
+    foreach ($headerMatches as $matches) {
+        if (!isset($matches[2])) {
+            $currentStatus = intval($matches[1]);
+            $allStatuses[] = $currentStatus;
+        } elseif ($currentStatus) {
+            $location = trim($matches[2]);
+            // Handle relative URLs
+            if (strpos($location, 'http') !== 0) {
+                if (strpos($location, '/') === 0) {
+                    $parsedUrl = parse_url($currentUrl);
+                    $location = $parsedUrl['scheme'] . '://' . $parsedUrl['host'] . $location;
+                } else {
+                    $location = rtrim($currentUrl, '/') . '/' . ltrim($location, '/');
                 }
-                $redirectChain[] = [
-                    'status' => $currentStatus,
-                    'url' => $location
-                ];
-                $currentUrl = $location;
             }
+            $redirectChain[] = [
+                'status' => $currentStatus,
+                'url' => $location
+            ];
+            $currentUrl = $location;
         }
     }
 
-    // Get the final status code (last status in the chain)
+    // Get the initial and final status codes (first and last in the chain)
+    $initialStatus = $allStatuses[0] ?? 0;
     $finalStatus = end($allStatuses);
     
     // If we have redirects and a final status
@@ -259,19 +467,19 @@ function checkUrl($url) {
         ];
     }
 
-    curl_close($ch);
-
     // Debug information
-    error_log("URL Check Debug: " . print_r([
-        'url' => $url,
-        'initial_status' => $initialStatus,
-        'final_url' => $finalUrl,
-        'redirect_count' => $redirectCount,
-        'redirect_chain' => $redirectChain,
-        'all_statuses' => $allStatuses,
-        'final_status' => $finalStatus,
-        'headers' => $headers
-    ], true));
+    if (VERBOSE_DEBUG) {
+        error_log("URL Check Debug: " . print_r([
+            'url' => $url,
+            'initial_status' => $initialStatus,
+            'final_url' => $finalUrl,
+            'redirect_count' => $redirectCount,
+            'redirect_chain' => $redirectChain,
+            'all_statuses' => $allStatuses,
+            'final_status' => $finalStatus,
+            'headers' => $headers
+        ], true));
+    }
 
     return [
         'source_url' => $url,
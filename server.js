@@ -41,6 +41,13 @@ const upload = multer({
     }
 });
 
+// Log full payloads and results only when DEBUG is set
+const debugLog = (...args) => {
+    if (process.env.DEBUG) {
+        console.log(...args);
+    }
+};
+
 // Get temp directory based on environment
 const getTempDir = () => {
     const baseDir = process.env.VERCEL ? '/tmp' : process.cwd();
@@ -51,6 +58,97 @@ const getTempDir = () => {
     return tempDir;
 };
 
+// PHP flags for the checker process. A capped memory_limit makes a runaway
+// batch fail fast with a PHP fatal error instead of growing until the whole
+// server gets OOM-killed.
+const getPhpArgs = () => [
+    '-d', `memory_limit=${process.env.PHP_MEMORY_LIMIT || '256M'}`,
+    '-d', 'max_execution_time=600',
+    'backend/api.php'
+];
+
+// Format a value as a CSV field, quoting it when it contains a comma,
+// quote or line break
+const toCsvField = (value) => {
+    const text = value === undefined || value === null ? '' : String(value);
+    return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+};
+
+// Total number of URLs checked in parallel, shared by all PHP workers
+const getMaxConcurrency = () => Math.max(1, parseInt(process.env.MAX_CONCURRENCY, 10) || 8);
+
+// Number of PHP workers for a batch. Checks are network-bound, so a single
+// process is the default and more are opt-in through PHP_WORKERS; never more
+// than the concurrency budget, and never so many that a worker gets fewer
+// than 25 URLs
+const MIN_URLS_PER_WORKER = 25;
+const getWorkerCount = (urlCount) => {
+    const maxWorkers = parseInt(process.env.PHP_WORKERS, 10) || 1;
+    return Math.max(1, Math.min(maxWorkers, getMaxConcurrency(), Math.ceil(urlCount / MIN_URLS_PER_WORKER)));
+};
+
+// Normalize a URL the same way backend/api.php does, so duplicates can be
+// detected before the batch is split across workers
+const normalizeUrl = (url) => {
+    const trimmed = String(url).trim();
+    return /^(?:f|ht)tps?:\/\//i.test(trimmed) ? trimmed : `http://${trimmed}`;
+};
+
+// Split URLs into contiguous shards so merged results keep the input order
+const splitIntoShards = (urls, count) => {
+    const size = Math.ceil(urls.length / count);
+    const shards = [];
+    for (let i = 0; i < urls.length; i += size) {
+        shards.push(urls.slice(i, i + size));
+    }
+    return shards;
+};
+
+// PHP processes that are still running, so shutdown can stop them
+const activePhpProcesses = new Set();
+
+// Run one PHP checker process over a shard of URLs with its share of the
+// concurrency budget and resolve with its stdout and stderr
+const runPhpChecker = (urls, concurrency, phpProcesses) => new Promise((resolve, reject) => {
+    const phpProcess = spawn('php', getPhpArgs(), {
+        stdio: ['pipe', 'pipe', 'pipe'],
+        env: {
+            ...process.env,
+            TEMP_DIR: path.dirname(getTempDir()),
+            MAX_CONCURRENCY: String(concurrency)
+        }
+    });
+    phpProcesses.push(phpProcess);
+    activePhpProcesses.add(phpProcess);
+
+    let phpOutput = '';
+    let phpError = '';
+
+    // Write URLs to PHP process stdin
+    phpProcess.stdin.write(JSON.stringify({ urls: urls }));
+    phpProcess.stdin.end();
+
+    phpProcess.stdout.on('data', (data) => {
+        phpOutput += data.toString();
+        debugLog('PHP stdout:', data.toString());
+    });
+
+    phpProcess.stderr.on('data', (data) => {
+        phpError += data.toString();
+        console.log('PHP stderr:', data.toString());
+    });
+
+    phpProcess.on('close', (code) => {
+        activePhpProcesses.delete(phpProcess);
+        console.log('PHP process closed with code', code);
+        if (code === 0 && phpOutput) {
+            resolve({ output: phpOutput, error: phpError });
+        } else {
+            reject(new Error(`PHP process failed with code ${code}\nOutput: ${phpOutput}\nError: ${phpError}`));
+        }
+    });
+});
+
 // Ensure required directories exist
 const ensureDirectories = () => {
     const tempDir = getTempDir();
@@ -68,10 +166,17 @@ ensureDirectories();
 // Handle file upload and URL checking
 app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
     console.log('Received request to /api/check-urls');
-    console.log('Request body:', req.body);
-    console.log('File:', req.file);
+    debugLog('Request body:', req.body);
+    debugLog('File:', req.file);
     
-    let phpProcess = null;
+    const phpProcesses = [];
+
+    // Stop the PHP workers right away if the client disconnects mid-batch
+    res.on('close', () => {
+        if (!res.writableFinished) {
+            phpProcesses.forEach(phpProcess => phpProcess.kill());
+        }
+    });
     
     try {
         // Ensure directories exist before processing
@@ -87,7 +192,7 @@ app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
         if (req.file) {
             console.log('Processing uploaded file');
             const content = req.file.buffer.toString('utf8');
-            console.log('File content:', content);
+            debugLog('File content:', content);
             const lines = content.split('\n');
             // Skip the first row (headers) and filter out empty lines
             urls = lines.slice(1).filter(url => url.trim());
@@ -96,7 +201,7 @@ app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
         
         // Handle URLs from form data
         if (req.body.urls_text) {
-            console.log('Processing URLs from text:', req.body.urls_text);
+            debugLog('Processing URLs from text:', req.body.urls_text);
             const textUrls = req.body.urls_text.split('\n').filter(url => url.trim());
             urls = urls.concat(textUrls);
         }
@@ -104,7 +209,7 @@ app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
         // Handle URLs from JSON data
         const jsonData = req.body.urls;
         if (jsonData && Array.isArray(jsonData)) {
-            console.log('Processing URLs from JSON:', jsonData);
+            debugLog('Processing URLs from JSON:', jsonData);
             urls = urls.concat(jsonData);
         }
 
@@ -113,7 +218,7 @@ app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
             return res.status(400).json({ error: 'No URLs provided' });
         }
 
-        console.log('Final URLs to process:', urls);
+        debugLog('Final URLs to process:', urls);
 
         // Set up response headers for streaming
         res.setHeader('Content-Type', 'application/json');
@@ -128,78 +233,34 @@ app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
             }
         }) + '\n');
 
-        // Start PHP process
-        console.log('Starting PHP process');
-        phpProcess = spawn('php', ['backend/api.php'], {
-            stdio: ['pipe', 'pipe', 'pipe']
-        });
-
-        let phpOutput = '';
-        let phpError = '';
-
-        // Write URLs to PHP process stdin
-        phpProcess.stdin.write(JSON.stringify({ urls: urls }));
-        phpProcess.stdin.end();
-
-        phpProcess.stdout.on('data', (data) => {
-            phpOutput += data.toString();
-            console.log('PHP stdout:', data.toString());
-        });
-
-        phpProcess.stderr.on('data', (data) => {
-            phpError += data.toString();
-            console.log('PHP stderr:', data.toString());
-        });
-
-        // Wait for PHP process to complete
-        await new Promise((resolve, reject) => {
-            phpProcess.on('close', (code) => {
-                console.log('PHP process closed with code', code);
-                if (code === 0 && phpOutput) {
-                    resolve();
-                } else {
-                    reject(new Error(`PHP process failed with code ${code}\nOutput: ${phpOutput}\nError: ${phpError}`));
-                }
-            });
-        });
+        // Check each distinct URL once, however the batch is sharded
+        const normalizedUrls = urls.map(normalizeUrl);
+        const uniqueUrls = [...new Set(normalizedUrls)];
+
+        // Start one PHP process per shard, splitting the concurrency budget
+        // between them (the remainder goes to the first shards), and wait for
+        // all of them
+        const shards = splitIntoShards(uniqueUrls, getWorkerCount(uniqueUrls.length));
+        const maxConcurrency = getMaxConcurrency();
+        const baseConcurrency = Math.floor(maxConcurrency / shards.length);
+        const extraConcurrency = maxConcurrency % shards.length;
+        console.log(`Starting ${shards.length} PHP process(es)`);
+        const phpResults = await Promise.all(shards.map((shard, index) => runPhpChecker(
+            shard,
+            baseConcurrency + (index < extraConcurrency ? 1 : 0),
+            phpProcesses
+        )));
 
         // Parse PHP output
         try {
-            const output = JSON.parse(phpOutput);
-            console.log('PHP output:', output);
-
-            // Generate CSV file
-            const csvRows = [
-                'Original URL,Final URL,Status Codes,Redirect Count'
-            ];
-
-            output.results.forEach(result => {
-                const statusCodes = [];
-                
-                // Add all statuses from redirect chain
-                if (result.redirect_chain) {
-                    result.redirect_chain.forEach((redirect, index) => {
-                        if (redirect.status) {
-                            statusCodes.push(redirect.status);
-                        }
-                        // Only add final status for the last redirect
-                        if (redirect.final_status && index === result.redirect_chain.length - 1) {
-                            statusCodes.push(redirect.final_status);
-                        }
-                    });
-                }
-
-                csvRows.push([
-                    result.source_url,
-                    result.target_url,
-                    statusCodes.join(' → '),
-                    result.redirect_chain ? result.redirect_chain.length : 0
-                ].join(','));
-            });
+            const uniqueResults = phpResults.flatMap(phpResult => JSON.parse(phpResult.output).results);
+            const resultsByUrl = new Map(uniqueUrls.map((url, index) => [url, uniqueResults[index]]));
+            // Map results back to every URL in the original order
+            const output = {
+                results: normalizedUrls.map(url => resultsByUrl.get(url))
+            };
+            debugLog('PHP output:', output);
 
-            // Create CSV content without the header row
-            const csvContent = csvRows.slice(1).join('\n');
-            
             // Generate unique filename
             const filename = `results_${Date.now()}.csv`;
             const filePath = path.join(getTempDir(), 'results', filename);
@@ -209,9 +270,49 @@ app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
             if (!fs.existsSync(resultsDir)) {
                 fs.mkdirSync(resultsDir, { recursive: true });
             }
-            
-            // Write CSV file
-            fs.writeFileSync(filePath, csvContent);
+
+            // Write CSV rows (without a header row) through an async file stream
+            // rather than writeFileSync, so the event loop is not blocked
+            const csvStream = fs.createWriteStream(filePath);
+            const csvWritten = new Promise((resolve, reject) => {
+                csvStream.on('finish', resolve);
+                csvStream.on('error', reject);
+            });
+
+            try {
+                output.results.forEach((result, resultIndex) => {
+                    const statusCodes = [];
+                    
+                    // Add all statuses from redirect chain
+                    if (result.redirect_chain) {
+                        result.redirect_chain.forEach((redirect, index) => {
+                            if (redirect.status) {
+                                statusCodes.push(redirect.status);
+                            }
+                            // Only add final status for the last redirect
+                            if (redirect.final_status && index === result.redirect_chain.length - 1) {
+                                statusCodes.push(redirect.final_status);
+                            }
+                        });
+                    }
+
+                    const row = [
+                        result.source_url,
+                        result.target_url,
+                        statusCodes.join(' → '),
+                        result.redirect_chain ? result.redirect_chain.length : 0
+                    ].map(toCsvField).join(',');
+                    csvStream.write(resultIndex > 0 ? '\n' + row : row);
+                });
+            } catch (error) {
+                // Don't leak the descriptor or leave a partial results file behind
+                csvStream.destroy();
+                fs.unlink(filePath, () => {});
+                throw error;
+            }
+
+            csvStream.end();
+            await csvWritten;
 
             // Send final progress with results and file link
             res.write(JSON.stringify({
@@ -226,15 +327,22 @@ app.post('/api/check-urls', upload.single('urls'), async (req, res) => {
             // End the response
             res.end();
         } catch (error) {
+            const phpOutput = phpResults.map(phpResult => phpResult.output).join('\n');
+            const phpError = phpResults.map(phpResult => phpResult.error).join('\n');
             throw new Error(`Failed to parse PHP output: ${error.message}\nOutput: ${phpOutput}\nError: ${phpError}`);
         }
 
     } catch (error) {
+        // The full error, including PHP's stdout and stderr, stays in the
+        // server log; the client only gets a short message
         console.error('Error processing URLs:', error);
-        if (phpProcess) {
-            phpProcess.kill();
+        phpProcesses.forEach(phpProcess => phpProcess.kill());
+        // Progress has already been streamed, so the status can no longer change
+        if (res.headersSent) {
+            res.end(JSON.stringify({ error: 'PHP checker failed' }) + '\n');
+        } else {
+            res.status(500).json({ error: 'PHP checker failed' });
         }
-        res.status(500).json({ error: error.message });
     }
 });
 
@@ -280,11 +388,13 @@ if (process.env.NODE_ENV !== 'production') {
 // Handle process termination
 process.on('SIGTERM', () => {
     console.log('SIGTERM received. Cleaning up...');
+    activePhpProcesses.forEach(phpProcess => phpProcess.kill());
     process.exit(0);
 });
 
 process.on('SIGINT', () => {
     console.log('SIGINT received. Cleaning up...');
+    activePhpProcesses.forEach(phpProcess => phpProcess.kill());
     process.exit(0);
 });
 